@@ -0,0 +1,21 @@
+"""Precompiled route patterns."""
+
+import re
+
+params_expr = re.compile(r"(<[^>]*>)")
+param_pattern = re.compile(
+    r"^<((?P<type>[a-zA-Z0-9_]+)(\((?P<pattern>.+)\))?\:)?(?P<name>[a-zA-Z0-9_]+)>$"
+)
+# Unanchored <type(pattern):name> scanner yielding param_pattern's groups
+path_arg_pattern = re.compile(
+    r"<(?:(?P<type>[a-zA-Z0-9_]+)(?:\((?P<pattern>[^>]+)\))?:)?(?P<name>[a-zA-Z0-9_]+)>"
+)
+
+# Regular expression matching each typed <type:name> path parameter
+path_type_patterns = {
+    None: r"([a-zA-Z0-9_]+)",
+    "string": r"([a-zA-Z0-9_]+)",
+    "int": r"([0-9]+)",
+    "float": r"([+-]?[0-9]+\.[0-9]+)",
+    "uuid": r"([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})",
+}
@@ -4,7 +4,6 @@ Freely adapted from https://github.com/aws/chalice
 
 """
 
-import base64
 import inspect
 import json
 import logging
@@ -13,81 +12,195 @@ import re
 import sys
 import warnings
 import zlib
-from functools import wraps
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from functools import lru_cache, wraps
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from aws_lambda_proxy import StatusCode
+from aws_lambda_proxy.patterns import param_pattern, params_expr, path_arg_pattern
+from aws_lambda_proxy.routing import Router, _arg_converters, _path_to_regex
 from aws_lambda_proxy.templates import redoc, swagger
 from aws_lambda_proxy.types import Response
 
-BINARY_TYPES = [
-    "application/octet-stream",
-    "application/x-protobuf",
-    "application/x-tar",
-    "application/zip",
-    "image/png",
-    "image/jpeg",
-    "image/jpg",
-    "image/tiff",
-    "image/webp",
-    "image/jp2",
-]
-
-params_expr = re.compile(r"(<[^>]*>)")
-proxy_pattern = re.compile(r"/{(?P<name>.+)\+}$")
-param_pattern = re.compile(
-    r"^<((?P<type>[a-zA-Z0-9_]+)(\((?P<pattern>.+)\))?\:)?(?P<name>[a-zA-Z0-9_]+)>$"
-)
-regex_pattern = re.compile(
-    r"^<(?P<type>regex)\((?P<pattern>.+)\):(?P<name>[a-zA-Z0-9_]+)>$"
+try:
+    import pybase64 as base64
+
+    _b64decode = base64.b64decode
+except ImportError:  # pragma: no cover
+    import base64  # type: ignore
+    from binascii import a2b_base64 as _b64decode  # type: ignore
+
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+except ImportError:  # pragma: no cover
+
+    def _json_dumps(obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+# Static error bodies, encoded once
+_missing_path_body = _json_dumps({"errorMessage": "Missing or invalid path"})
+_invalid_token_body = _json_dumps({"message": "Invalid access token"})
+
+BINARY_TYPES = frozenset(
+    {
+        "application/octet-stream",
+        "application/x-protobuf",
+        "application/x-tar",
+        "application/zip",
+        "image/png",
+        "image/jpeg",
+        "image/jpg",
+        "image/tiff",
+        "image/webp",
+        "image/jp2",
+    }
 )
 
+# zlib level 6 is the usual speed/size tradeoff; bodies smaller than a
+# single TCP segment gain nothing from compression.
+COMPRESS_LEVEL = 6
+MIN_COMPRESS_BYTES = 512
 
-def _path_to_regex(path: str) -> str:
-    path = f"^{path}$"  # full match
-    path = re.sub(r"<[a-zA-Z0-9_]+>", r"([a-zA-Z0-9_]+)", path)
-    path = re.sub(r"<string\:[a-zA-Z0-9_]+>", r"([a-zA-Z0-9_]+)", path)
-    path = re.sub(r"<int\:[a-zA-Z0-9_]+>", r"([0-9]+)", path)
-    path = re.sub(r"<float\:[a-zA-Z0-9_]+>", "([+-]?[0-9]+.[0-9]+)", path)
-    path = re.sub(
-        r"<uuid\:[a-zA-Z0-9_]+>",
-        "([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})",
-        path,
-    )
-    for param in re.findall(r"(<regex[^>]*>)", path):
-        matches = regex_pattern.search(param)
-        expr = matches.groupdict()["pattern"]
-        path = path.replace(param, f"({expr})")
 
-    return path
+def _gzip_compress(body: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(body) + compressor.flush()
 
 
-def _path_to_openapi(path: str) -> str:
-    for param in re.findall(r"(<regex[^>]*>)", path):
-        match = regex_pattern.search(param).groupdict()
-        name = match["name"]
-        path = path.replace(param, f"<regex:{name}>")
+def _deflate_compress(body: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
 
-    path = re.sub(r"<([a-zA-Z0-9_]+\:)?", "{", path)
-    return re.sub(r">", "}", path)
+
+compressors: Dict[str, Callable[[bytes, int], bytes]] = {
+    "gzip": _gzip_compress,
+    "zlib": zlib.compress,
+    "deflate": _deflate_compress,
+}
+
+
+def _openapi_param(match: re.Match) -> str:
+    arg = param_pattern.match(match.group(1))
+    return "{" + arg.group("name") + "}" if arg else match.group(1)
+
+
+@lru_cache(maxsize=1024)
+def _path_to_openapi(path: str) -> str:
+    return params_expr.sub(_openapi_param, path)
 
 
 def _converters(value: str, path_arg: str) -> Any:
     match = param_pattern.match(path_arg)
     if match:
-        arg_type = match.groupdict()["type"]
-        if arg_type == "int":
-            return int(value)
-        if arg_type == "float":
-            return float(value)
-        if arg_type in ["string", "uuid"]:
-            return value
+        return _arg_converters.get(match.groupdict()["type"], str)(value)
     return value
 
 
+def _build_openapi_parameters(
+    endpoint_args: Mapping[str, inspect.Parameter], args_in_path: Sequence[Dict]
+) -> List[Dict]:
+    """Return OpenAPI path and query parameters of an endpoint."""
+    argspath_schema = {
+        "default": {"type": "string"},
+        "string": {"type": "string"},
+        "str": {"type": "string"},
+        "regex": {"type": "string", "pattern": ""},
+        "uuid": {"type": "string", "format": "uuid"},
+        "int": {"type": "integer"},
+        "float": {"type": "number", "format": "float"},
+    }
+
+    endpoint_args_names = list(endpoint_args.keys())
+
+    parameters: List[Dict] = []
+    for arg in args_in_path:
+        annotation = endpoint_args[arg["name"]]
+        endpoint_args_names.remove(arg["name"])
+
+        parameter = {
+            "name": arg["name"],
+            "in": "path",
+            "schema": {"type": "string"},
+        }
+
+        if arg["type"] is not None:
+            parameter["schema"] = argspath_schema[arg["type"]]
+            if arg["type"] == "regex":
+                parameter["schema"]["pattern"] = f"^{arg['pattern']}$"
+
+        if annotation.default is not inspect.Parameter.empty:
+            parameter["schema"]["default"] = annotation.default
+        else:
+            parameter["required"] = True
+
+        parameters.append(parameter)
+
+    for name, arg in endpoint_args.items():
+        if name not in endpoint_args_names:
+            continue
+        parameter = {"name": name, "in": "query", "schema": {}}
+        if arg.default is not inspect.Parameter.empty:
+            parameter["schema"]["default"] = arg.default
+        elif arg.kind == inspect.Parameter.VAR_KEYWORD:
+            parameter["schema"]["format"] = "dict"
+        else:
+            parameter["schema"]["format"] = "string"
+            parameter["required"] = True
+
+        parameters.append(parameter)
+    return parameters
+
+
+def _cors_headers(methods: Sequence[str]) -> Dict[str, str]:
+    """Return CORS headers allowing the given methods."""
+    return {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": ",".join(methods),
+        "Access-Control-Allow-Credentials": "true",
+    }
+
+
 class RouteEntry:
     """Decode request path."""
 
+    __slots__ = (
+        "endpoint",
+        "path",
+        "route_regex",
+        "_regex",
+        "openapi_path",
+        "methods",
+        "cors",
+        "cors_headers",
+        "token",
+        "compression",
+        "compression_level",
+        "compression_min_bytes",
+        "b64encode",
+        "ttl",
+        "cache_control",
+        "cache_header",
+        "description",
+        "_openapi_parameters",
+        "_path_args",
+        "_arg_names",
+        "_arg_converters",
+        "tag",
+    )
+
     def __init__(
         self,
         endpoint: Callable,
@@ -101,55 +214,101 @@ class RouteEntry:
         cache_control: Optional[str] = None,
         description: Optional[str] = None,
         tag: Optional[Tuple] = None,
+        compression_level: int = COMPRESS_LEVEL,
+        compression_min_bytes: int = MIN_COMPRESS_BYTES,
     ) -> None:
         """Initialize route object."""
         self.endpoint = endpoint
         self.path = path
         self.route_regex = _path_to_regex(path)
+        self._regex = re.compile(self.route_regex)
         self.openapi_path = _path_to_openapi(self.path)
         self.methods = methods or ["GET"]
         self.cors = cors
+        self.cors_headers = _cors_headers(self.methods) if cors else {}
         self.token = token
         self.compression = payload_compression_method
+        self.compression_level = compression_level
+        self.compression_min_bytes = compression_min_bytes
         self.b64encode = binary_b64encode
         self.ttl = ttl
         self.cache_control = cache_control
+        self.cache_header = f"max-age={ttl}" if ttl else cache_control
         self.description = description or self.endpoint.__doc__
+        self._openapi_parameters: Optional[List[Dict]] = None
+        self._path_args = tuple(
+            arg.groupdict() for arg in path_arg_pattern.finditer(path)
+        )
+        self._arg_names = tuple(arg["name"] for arg in self._path_args)
+        self._arg_converters = tuple(
+            _arg_converters.get(arg["type"], str) for arg in self._path_args
+        )
         self.tag = tag
-        if self.compression and self.compression not in [
-            "gzip",
-            "zlib",
-            "deflate",
-        ]:
+        if self.compression and self.compression not in compressors:
             raise ValueError(
                 f"'{payload_compression_method}' is not a supported compression"
             )
+        if not -1 <= compression_level <= 9:
+            raise ValueError(f"'{compression_level}' is not a valid compression level")
+        if self._regex.groups != len(self._arg_names):
+            raise ValueError(
+                f"Route '{path}' has capture groups in a regex() pattern, "
+                "use non-capturing groups (?:...) instead"
+            )
 
     def __eq__(self, other) -> bool:
         """Check for equality."""
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, RouteEntry):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__
+            if name != "_openapi_parameters"
+        )
+
+    @property
+    def openapi_parameters(self) -> List[Dict]:
+        """Return OpenAPI parameters of the endpoint, built on first access."""
+        if self._openapi_parameters is None:
+            self._openapi_parameters = _build_openapi_parameters(
+                inspect.signature(self.endpoint).parameters, self._get_path_args()
+            )
+        return self._openapi_parameters
 
     def _get_path_args(self) -> Sequence[Any]:
-        route_args = [i.group() for i in params_expr.finditer(self.path)]
-        args = [param_pattern.match(arg).groupdict() for arg in route_args]
-        return args
+        return self._path_args
+
+
+def _get_host(headers: Mapping[str, str]) -> str:
+    """Return the forwarded host of a request, or its Host header."""
+    host = headers.get("x-forwarded-host")
+    return headers.get("host", "") if host is None else host
 
 
 def _get_apigw_stage(event: Dict) -> str:
     """Return API Gateway stage name."""
-    header = event.get("headers", {})
-    host = header.get("x-forwarded-host", header.get("host", ""))
+    host = _get_host(event.get("headers", {}))
     if ".execute-api." in host and ".amazonaws.com" in host:
         stage = event["requestContext"].get("stage", "")
         return stage
     return ""
 
 
+@lru_cache(maxsize=256)
+def _split_proxy_resource(resource: str) -> Tuple[str, Optional[str]]:
+    """Split a `/prefix/{name+}` resource into its prefix and proxy name."""
+    if resource.endswith("+}"):
+        start = resource.rfind("/{")
+        if start != -1 and start + 2 < len(resource) - 2:
+            return resource[:start], resource[start + 2 : -2]
+    return resource, None
+
+
 def _get_request_path(event: Dict) -> Optional[str]:
     """Return API call path."""
-    resource_proxy = proxy_pattern.search(event.get("resource", "/"))
-    if resource_proxy:
-        proxy_path = event["pathParameters"].get(resource_proxy["name"])
+    _, proxy_name = _split_proxy_resource(event.get("resource", "/"))
+    if proxy_name:
+        proxy_path = event["pathParameters"].get(proxy_name)
         return f"/{proxy_path}"
 
     return event.get("path")
@@ -158,12 +317,23 @@ def _get_request_path(event: Dict) -> Optional[str]:
 class ApigwPath:
     """Parse path of API Call."""
 
+    __slots__ = (
+        "version",
+        "apigw_stage",
+        "path",
+        "api_prefix",
+        "path_mapping",
+        "prefix",
+    )
+
     def __init__(self, event: Dict):
         """Initialize API Gateway Path Info object."""
         self.version = event.get("version")
         self.apigw_stage = _get_apigw_stage(event)
         self.path = _get_request_path(event)
-        self.api_prefix = proxy_pattern.sub("", event.get("resource", "")).rstrip("/")
+        self.api_prefix = _split_proxy_resource(event.get("resource", ""))[0].rstrip(
+            "/"
+        )
         if not self.apigw_stage and self.path:
             path = event.get("path", "")
             suffix = self.api_prefix + self.path
@@ -171,14 +341,12 @@ class ApigwPath:
         else:
             self.path_mapping = ""
 
-    @property
-    def prefix(self):
-        """Return the API prefix."""
         if self.apigw_stage and self.apigw_stage != "$default":
-            return f"/{self.apigw_stage}" + self.api_prefix
-        if self.path_mapping:
-            return self.path_mapping + self.api_prefix
-        return self.api_prefix
+            self.prefix = f"/{self.apigw_stage}" + self.api_prefix
+        elif self.path_mapping:
+            self.prefix = self.path_mapping + self.api_prefix
+        else:
+            self.prefix = self.api_prefix
 
 
 class API:
@@ -201,6 +369,9 @@ class API:
         self.description: Optional[str] = description
         self.version: str = version
         self.routes: List[RouteEntry] = []
+        self._router = Router()
+        self._openapi_cache: Dict[Tuple[str, str], Dict] = {}
+        self._openapi_json_cache: Dict[str, str] = {}
         self.context: Dict = {}
         self.event: Dict = {}
         self.request_path: ApigwPath
@@ -215,9 +386,7 @@ class API:
     @property
     def host(self) -> str:
         """Construct api gateway endpoint url."""
-        host = self.event["headers"].get(
-            "x-forwarded-host", self.event["headers"].get("host", "")
-        )
+        host = _get_host(self.event["headers"])
         path_info = self.request_path
         if path_info.apigw_stage and path_info.apigw_stage != "$default":
             host_suffix = f"/{path_info.apigw_stage}"
@@ -228,62 +397,16 @@ class API:
         return f"{scheme}://{host}{host_suffix}"
 
     def _get_parameters(self, route: RouteEntry) -> List[Dict]:
-        argspath_schema = {
-            "default": {"type": "string"},
-            "string": {"type": "string"},
-            "str": {"type": "string"},
-            "regex": {"type": "string", "pattern": ""},
-            "uuid": {"type": "string", "format": "uuid"},
-            "int": {"type": "integer"},
-            "float": {"type": "number", "format": "float"},
-        }
-
-        args_in_path = route._get_path_args()
-        endpoint_args = inspect.signature(route.endpoint).parameters
-        endpoint_args_names = list(endpoint_args.keys())
-
-        parameters: List[Dict] = []
-        for arg in args_in_path:
-            annotation = endpoint_args[arg["name"]]
-            endpoint_args_names.remove(arg["name"])
-
-            parameter = {
-                "name": arg["name"],
-                "in": "path",
-                "schema": {"type": "string"},
-            }
-
-            if arg["type"] is not None:
-                parameter["schema"] = argspath_schema[arg["type"]]
-                if arg["type"] == "regex":
-                    parameter["schema"]["pattern"] = f"^{arg['pattern']}$"
-
-            if annotation.default is not inspect.Parameter.empty:
-                parameter["schema"]["default"] = annotation.default
-            else:
-                parameter["required"] = True
-
-            parameters.append(parameter)
-
-        for name, arg in endpoint_args.items():
-            if name not in endpoint_args_names:
-                continue
-            parameter = {"name": name, "in": "query", "schema": {}}
-            if arg.default is not inspect.Parameter.empty:
-                parameter["schema"]["default"] = arg.default
-            elif arg.kind == inspect.Parameter.VAR_KEYWORD:
-                parameter["schema"]["format"] = "dict"
-            else:
-                parameter["schema"]["format"] = "string"
-                parameter["required"] = True
-
-            parameters.append(parameter)
-        return parameters
+        return route.openapi_parameters
 
     def _get_openapi(
         self, openapi_version: str = "3.0.2", openapi_prefix: str = ""
     ) -> Dict:
         """Get OpenAPI documentation."""
+        cache_key = (openapi_version, openapi_prefix)
+        if cache_key in self._openapi_cache:
+            return self._openapi_cache[cache_key]
+
         info = {"title": self.name, "version": self.version}
         if self.description:
             info["description"] = self.description
@@ -341,6 +464,7 @@ class API:
             output["components"] = components
 
         output["paths"] = paths
+        self._openapi_cache[cache_key] = output
         return output
 
     def _configure_logging(self) -> None:
@@ -361,21 +485,20 @@ class API:
         self.log.addHandler(handler)
 
     def _already_configured(self, log) -> bool:
-        if not log.handlers:
-            return False
-
-        for handler in log.handlers:
-            if isinstance(handler, logging.StreamHandler):
-                if handler.stream == sys.stdout:
-                    return True
-
-        return False
+        return any(
+            isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout
+            for handler in log.handlers
+        )
 
     def _add_route(self, path: str, endpoint: Callable, **kwargs) -> RouteEntry:
         methods = kwargs.pop("methods", ["GET"])
         cors = kwargs.pop("cors", False)
         token = kwargs.pop("token", "")
         payload_compression = kwargs.pop("payload_compression_method", "")
+        compression_level = kwargs.pop("payload_compression_level", COMPRESS_LEVEL)
+        compression_min_bytes = kwargs.pop(
+            "payload_compression_min_bytes", MIN_COMPRESS_BYTES
+        )
         binary_encode = kwargs.pop("binary_b64encode", False)
         ttl = kwargs.pop("ttl", None)
         cache_control = kwargs.pop("cache_control", None)
@@ -401,6 +524,9 @@ class API:
                     f'Duplicate route detected: "{path}"\n' "URL paths must be unique."
                 )
 
+        self._openapi_cache.clear()
+        self._openapi_json_cache.clear()
+
         route = RouteEntry(
             endpoint,
             path,
@@ -413,38 +539,18 @@ class API:
             cache_control,
             description,
             tag,
+            compression_level,
+            compression_min_bytes,
         )
+        self._router.add(route)
         self.routes.append(route)
         return route
 
     def _checkroute(self, path: str, method: str) -> bool:
-        for route in self.routes:
-            if method in route.methods and path == route.path:
-                return True
-        return False
-
-    def _url_matching(self, url: str, method: str) -> Optional[RouteEntry]:
-        for route in self.routes:
-            expr = re.compile(route.route_regex)
-            if method in route.methods and expr.match(url):
-                return route
-
-        return None
+        return (method, path) in self._router
 
-    def _get_matching_args(self, route: RouteEntry, url: str) -> Dict:
-        route_expr = re.compile(route.route_regex)
-        route_args = [i.group() for i in params_expr.finditer(route.path)]
-        url_args = route_expr.match(url).groups()
-
-        names = [param_pattern.match(arg).groupdict()["name"] for arg in route_args]
-
-        args = [
-            _converters(u, route_args[id])
-            for id, u in enumerate(url_args)
-            if u != route_args[id]
-        ]
-
-        return dict(zip(names, args))
+    def _url_matching(self, url: str, method: str) -> Optional[Tuple[RouteEntry, Dict]]:
+        return self._router.match(url, method)
 
     def _validate_token(self, token: Optional[str] = None) -> bool:
         env_token = os.environ.get("TOKEN")
@@ -525,12 +631,16 @@ class API:
 
         def _openapi() -> Response:
             """Return OpenAPI json."""
+            openapi_prefix = self.request_path.prefix
+            body = self._openapi_json_cache.get(openapi_prefix)
+            if body is None:
+                body = _json_dumps(self._get_openapi(openapi_prefix=openapi_prefix))
+                self._openapi_json_cache[openapi_prefix] = body
+
             return Response(
                 status_code=StatusCode.OK,
                 content_type="application/json",
-                body=json.dumps(
-                    self._get_openapi(openapi_prefix=self.request_path.prefix)
-                ),
+                body=body,
             )
 
         self._add_route(openapi_url, _openapi, cors=True, tag=["documentation"])
@@ -573,54 +683,45 @@ class API:
         b64encode: bool = False,
         ttl: Optional[int] = None,
         cache_control: Optional[str] = None,
+        compression_level: int = COMPRESS_LEVEL,
+        compression_min_bytes: int = MIN_COMPRESS_BYTES,
+        cors_headers: Optional[Mapping[str, str]] = None,
     ):
         """Return HTTP response.
 
         including response code (status), headers and body
 
         """
-        accepted_methods = accepted_methods or []
         headers = response.headers or {}
         headers["Content-Type"] = response.content_type
 
         if cors:
-            headers["Access-Control-Allow-Origin"] = "*"
-            headers["Access-Control-Allow-Methods"] = ",".join(accepted_methods)
-            headers["Access-Control-Allow-Credentials"] = "true"
+            headers.update(cors_headers or _cors_headers(accepted_methods or []))
 
         response_body = response.body
         if compression and compression in accepted_compression:
-            headers["Content-Encoding"] = compression
-            if isinstance(response_body, str):
-                response_body = bytes(response_body, "utf-8")
-
-            if compression == "gzip":
-                gzip_compress = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
-                response_body = (
-                    gzip_compress.compress(response_body) + gzip_compress.flush()
-                )
-            elif compression == "zlib":
-                zlib_compress = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS)
-                response_body = (
-                    zlib_compress.compress(response_body) + zlib_compress.flush()
-                )
-            elif compression == "deflate":
-                deflate_compress = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
-                response_body = (
-                    deflate_compress.compress(response_body) + deflate_compress.flush()
-                )
-            else:
-                return self.response(
-                    Response(
-                        status_code=StatusCode.INTERNAL_SERVER_ERROR,
-                        content_type="application/json",
-                        body=json.dumps(
-                            {
-                                "errorMessage": f"Unsupported compression mode: {compression}"
-                            }
-                        ),
+            body_bytes = (
+                response_body.encode("utf-8")
+                if isinstance(response_body, str)
+                else response_body
+            )
+            if len(body_bytes) >= compression_min_bytes:
+                compress = compressors.get(compression)
+                if not compress:
+                    return self.response(
+                        Response(
+                            status_code=StatusCode.INTERNAL_SERVER_ERROR,
+                            content_type="application/json",
+                            body=_json_dumps(
+                                {
+                                    "errorMessage": f"Unsupported compression mode: {compression}"
+                                }
+                            ),
+                        )
                     )
-                )
+
+                headers["Content-Encoding"] = compression
+                response_body = compress(body_bytes, compression_level)
 
         if ttl:
             headers["Cache-Control"] = (
@@ -637,11 +738,13 @@ class API:
             "headers": headers,
             "statusCode": response.status_code.value,
         }
-        if (
+        if b64encode and (
             response.content_type in BINARY_TYPES or not isinstance(response_body, str)
-        ) and b64encode:
+        ):
+            if isinstance(response_body, str):
+                response_body = response_body.encode("utf-8")
             message_data["isBase64Encoded"] = True
-            message_data["body"] = base64.b64encode(response_body).decode()  # type: ignore
+            message_data["body"] = base64.b64encode(response_body).decode("ascii")
         else:
             message_data["body"] = response_body
 
@@ -649,62 +752,63 @@ class API:
 
     def __call__(self, event, context):
         """Initialize route and handlers."""
-        self.log.debug(json.dumps(event, default=str))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(json.dumps(event, default=str))
 
         self.event = event
         self.context = context
 
         # HACK: For an unknown reason some keys can have lower or upper case.
         # To make sure the app works well we cast all the keys to lowercase.
-        headers = self.event.get("headers", {}) or {}
-        self.event["headers"] = dict(
-            (key.lower(), value) for key, value in headers.items()
-        )
-
-        self.request_path = ApigwPath(self.event)
-        if self.request_path.path is None:
+        # API Gateway HTTP API (payload 2.0) already sends lowercase names.
+        headers = event.get("headers") or {}
+        if headers and event.get("version") != "2.0":
+            headers = {key.lower(): value for key, value in headers.items()}
+        event["headers"] = headers
+
+        self.request_path = ApigwPath(event)
+        path = self.request_path.path
+        if path is None:
             return self.response(
                 Response(
                     status_code=StatusCode.BAD_REQUEST,
                     content_type="application/json",
-                    body=json.dumps({"errorMessage": "Missing or invalid path"}),
+                    body=_missing_path_body,
                 )
             )
 
         http_method = event["httpMethod"]
-        route_entry = self._url_matching(self.request_path.path, http_method)
-        if not route_entry:
-            error_message = (
-                f"No view function for: {http_method} - {self.request_path.path}"
-            )
+        route_match = self._url_matching(path, http_method)
+        if not route_match:
+            error_message = f"No view function for: {http_method} - {path}"
             return self.response(
                 Response(
                     status_code=StatusCode.BAD_REQUEST,
                     content_type="application/json",
-                    body=json.dumps({"errorMessage": error_message}),
+                    body=_json_dumps({"errorMessage": error_message}),
                 )
             )
 
-        request_params = event.get("queryStringParameters", {}) or {}
+        route_entry, function_kwargs = route_match
+        request_params = event.get("queryStringParameters") or {}
         if route_entry.token:
             if not self._validate_token(request_params.get("access_token")):
                 return self.response(
                     Response(
                         status_code=StatusCode.INTERNAL_SERVER_ERROR,
                         content_type="application/json",
-                        body=json.dumps({"message": "Invalid access token"}),
+                        body=_invalid_token_body,
                     )
                 )
 
         # remove access_token from kwargs
-        request_params.pop("access_token", False)
+        request_params.pop("access_token", None)
 
-        function_kwargs = self._get_matching_args(route_entry, self.request_path.path)
-        function_kwargs.update(request_params.copy())
-        if http_method in ["POST", "PUT", "PATCH"] and event.get("body"):
-            body = event["body"]
+        function_kwargs.update(request_params)
+        body = event.get("body")
+        if body and http_method in ("POST", "PUT", "PATCH"):
             if event.get("isBase64Encoded"):
-                body = base64.b64decode(body).decode()
+                body = _b64decode(body).decode()
             function_kwargs.update({"body": body})
 
         try:
@@ -714,16 +818,18 @@ class API:
             response = Response(
                 status_code=StatusCode.INTERNAL_SERVER_ERROR,
                 content_type="application/json",
-                body=json.dumps({"errorMessage": str(err)}),
+                body=_json_dumps({"errorMessage": str(err)}),
             )
 
         return self.response(
             response=response,
             cors=route_entry.cors,
             accepted_methods=route_entry.methods,
-            accepted_compression=self.event["headers"].get("accept-encoding", ""),
+            accepted_compression=headers.get("accept-encoding", ""),
             compression=route_entry.compression,
             b64encode=route_entry.b64encode,
-            ttl=route_entry.ttl,
-            cache_control=route_entry.cache_control,
+            cache_control=route_entry.cache_header,
+            compression_level=route_entry.compression_level,
+            compression_min_bytes=route_entry.compression_min_bytes,
+            cors_headers=route_entry.cors_headers,
         )
@@ -0,0 +1,256 @@
+"""Match request paths against registered routes."""
+
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from aws_lambda_proxy.patterns import (
+    param_pattern,
+    params_expr,
+    path_arg_pattern,
+    path_type_patterns,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aws_lambda_proxy.proxy import RouteEntry
+
+
+_arg_converters: Dict[str, Callable[[str], Any]] = {"int": int, "float": float}
+
+# Number of resolved dynamic (method, path) lookups kept by each router
+MATCH_CACHE_SIZE = 512
+
+
+def _regex_param(match: re.Match) -> str:
+    arg = param_pattern.match(match.group(1))
+    if not arg:
+        return match.group(1)
+    if arg.group("type") == "regex" and arg.group("pattern"):
+        return f"({arg.group('pattern')})"
+    return path_type_patterns.get(arg.group("type"), match.group(1))
+
+
+@lru_cache(maxsize=1024)
+def _path_to_regex(path: str) -> str:
+    return "^" + params_expr.sub(_regex_param, path) + "$"  # full match
+
+
+class RouteTrieNode:
+    """Path segment node of the routing trie."""
+
+    __slots__ = ("static_children", "param_children", "leaves")
+
+    def __init__(self) -> None:
+        """Initialize trie node."""
+        self.static_children: Dict[str, "RouteTrieNode"] = {}
+        self.param_children: Dict[
+            str,
+            Tuple[re.Pattern, Tuple[str, ...], Tuple[Callable, ...], "RouteTrieNode"],
+        ] = {}
+        self.leaves: Dict[str, Tuple[int, "RouteEntry"]] = {}
+
+    def insert(self, segments: Sequence[str], route: "RouteEntry", index: int) -> None:
+        """Register route for each of its methods at the end of segments."""
+        node = self
+        for segment in segments:
+            if "<" not in segment:
+                node = node.static_children.setdefault(segment, RouteTrieNode())
+                continue
+
+            if segment not in node.param_children:
+                args = [arg.groupdict() for arg in path_arg_pattern.finditer(segment)]
+                node.param_children[segment] = (
+                    re.compile(_path_to_regex(segment)),
+                    tuple(arg["name"] for arg in args),
+                    tuple(_arg_converters.get(arg["type"], str) for arg in args),
+                    RouteTrieNode(),
+                )
+            node = node.param_children[segment][3]
+
+        for method in route.methods:
+            node.leaves.setdefault(method, (index, route))
+
+    def lookup(
+        self, segments: Sequence[str], method: str, depth: int = 0
+    ) -> Optional[Tuple[int, "RouteEntry", Dict]]:
+        """Find the first registered route matching segments."""
+        if depth == len(segments):
+            leaf = self.leaves.get(method)
+            return (leaf[0], leaf[1], {}) if leaf else None
+
+        segment = segments[depth]
+        best = None
+        child = self.static_children.get(segment)
+        if child:
+            best = child.lookup(segments, method, depth + 1)
+
+        for expr, names, converters, child in self.param_children.values():
+            match = expr.fullmatch(segment)
+            if not match:
+                continue
+            found = child.lookup(segments, method, depth + 1)
+            if found and (best is None or found[0] < best[0]):
+                for name, convert, value in zip(names, converters, match.groups()):
+                    found[2][name] = convert(value)
+                best = found
+
+        return best
+
+
+def _combine_route_patterns(
+    entries: Sequence[Tuple[int, "RouteEntry"]],
+) -> Tuple[re.Pattern, Dict[str, Tuple[int, "RouteEntry", int]]]:
+    """Join route patterns in a single alternation, tried in registration order.
+
+    Each route is wrapped in a named group, mapped to the route and the number of
+    that group so its own captures can be sliced out of the match.
+    """
+    parts: List[str] = []
+    groups: Dict[str, Tuple[int, "RouteEntry", int]] = {}
+    group = 1
+    for index, route in entries:
+        name = f"r{index}"
+        parts.append(f"(?P<{name}>{route.route_regex[1:-1]})")
+        groups[name] = (index, route, group)
+        group += route._regex.groups + 1
+
+    return re.compile("^(?:" + "|".join(parts) + ")$"), groups
+
+
+def _get_matching_args(
+    route: "RouteEntry", url_args: Sequence[Optional[str]]
+) -> Dict[str, Any]:
+    return {
+        name: convert(value)
+        for name, convert, value in zip(
+            route._arg_names, route._arg_converters, url_args
+        )
+    }
+
+
+class Router:
+    """Find the route registered for a request method and path.
+
+    Literal paths are looked up in a dict, other paths walk a segment trie and
+    `<regex(...)>` routes, which may span segments, share one alternation per
+    method. When several routes match, the first registered one wins.
+    """
+
+    __slots__ = (
+        "_route_trie",
+        "_static_routes",
+        "_first_dynamic",
+        "_first_regex",
+        "_regex_routes",
+        "_regex_routers",
+        "_registered",
+        "_size",
+        "_match_cache",
+    )
+
+    def __init__(self) -> None:
+        """Initialize empty router."""
+        self._route_trie = RouteTrieNode()
+        self._static_routes: Dict[Tuple[str, str], Tuple[int, "RouteEntry"]] = {}
+        # Index of the first parameterized and first regex route of each method
+        self._first_dynamic: Dict[str, int] = {}
+        self._first_regex: Dict[str, int] = {}
+        self._regex_routes: Dict[str, List[Tuple[int, "RouteEntry"]]] = {}
+        self._regex_routers: Dict[
+            str, Tuple[re.Pattern, Dict[str, Tuple[int, "RouteEntry", int]]]
+        ] = {}
+        self._registered: Set[Tuple[str, str]] = set()
+        self._size = 0
+        self._match_cache: "OrderedDict[Tuple[str, str], Tuple[RouteEntry, Dict]]" = (
+            OrderedDict()
+        )
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        """Check whether a (method, path) pair is registered."""
+        return key in self._registered
+
+    def add(self, route: "RouteEntry") -> None:
+        """Register route for each of its methods."""
+        index = self._size
+        self._size += 1
+
+        path = route.path
+        if "<regex" in path:
+            # Custom patterns may span several path segments
+            for method in route.methods:
+                self._regex_routes.setdefault(method, []).append((index, route))
+                self._regex_routers.pop(method, None)
+                self._first_dynamic.setdefault(method, index)
+                self._first_regex.setdefault(method, index)
+        else:
+            self._route_trie.insert(path.split("/"), route, index)
+            for method in route.methods:
+                if "<" in path:
+                    self._first_dynamic.setdefault(method, index)
+                else:
+                    self._static_routes[(method, path)] = (index, route)
+
+        self._registered.update((method, path) for method in route.methods)
+        self._match_cache.clear()
+
+    def match(self, url: str, method: str) -> Optional[Tuple["RouteEntry", Dict]]:
+        """Return the route matching url and its converted path arguments."""
+        key = (method, url)
+        cached = self._match_cache.get(key)
+        if cached:
+            self._match_cache.move_to_end(key)
+            return cached[0], dict(cached[1])
+
+        static = self._static_routes.get(key)
+        if static and static[0] < self._first_dynamic.get(method, self._size):
+            # No parameterized route registered earlier can take precedence
+            return static[1], {}
+
+        found = self._route_trie.lookup(url.split("/"), method)
+        if not found or found[0] > self._first_regex.get(method, found[0]):
+            # Only a regex route registered before the trie match may win
+            regex_match = self._regex_matching(url, method)
+            if regex_match and (not found or regex_match[0] < found[0]):
+                index, route, url_args = regex_match
+                found = (index, route, _get_matching_args(route, url_args))
+
+        if not found:
+            # Misses are not cached so 404 traffic cannot evict resolved paths
+            return None
+
+        result = (found[1], found[2])
+        self._match_cache[key] = result
+        if len(self._match_cache) > MATCH_CACHE_SIZE:
+            self._match_cache.popitem(last=False)
+        return result[0], dict(result[1])
+
+    def _regex_matching(
+        self, url: str, method: str
+    ) -> Optional[Tuple[int, "RouteEntry", Sequence[Optional[str]]]]:
+        entries = self._regex_routes.get(method)
+        if not entries:
+            return None
+
+        regex_router = self._regex_routers.get(method)
+        if regex_router is None:
+            # Rebuilt on first request after a regex route was added
+            regex_router = _combine_route_patterns(entries)
+            self._regex_routers[method] = regex_router
+
+        expr, groups = regex_router
+        match = expr.fullmatch(url)
+        if not match:
+            return None
+        index, route, group = groups[match.lastgroup]  # type: ignore
+        return index, route, match.groups()[group : group + route._regex.groups]
@@ -1,12 +1,38 @@
 from dataclasses import dataclass
-from typing import Optional, Union
+from typing import Any, Optional, Tuple, Union
 
 from aws_lambda_proxy import StatusCode
 
 
 @dataclass(frozen=True)
 class Response:
+    # Declared by hand (not slots=True) to keep Python 3.9 support, so headers
+    # gets its default in __init__ rather than from a class attribute
+    __slots__ = ("status_code", "content_type", "body", "headers")
+
     status_code: StatusCode
     content_type: str
     body: Union[str, bytes]
-    headers: Optional[dict[str, str]] = None
+    headers: Optional[dict[str, str]]
+
+    def __init__(
+        self,
+        status_code: StatusCode,
+        content_type: str,
+        body: Union[str, bytes],
+        headers: Optional[dict[str, str]] = None,
+    ) -> None:
+        """Initialize response."""
+        object.__setattr__(self, "status_code", status_code)
+        object.__setattr__(self, "content_type", content_type)
+        object.__setattr__(self, "body", body)
+        object.__setattr__(self, "headers", headers)
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        """Return slot values for copy and pickle."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        """Restore slot values bypassing the frozen __setattr__."""
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
@@ -0,0 +1,50 @@
+"""Shared fixtures for aws-lambda-proxy tests."""
+
+import functools
+import logging
+import os
+
+import pytest
+
+# Prefer the fastest JSON parser installed; all of them accept bytes
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover
+    try:
+        from ujson import loads as json_loads
+    except ImportError:
+        from json import loads as json_loads
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_fixture(name: str):
+    """Parse a JSON fixture file once per process."""
+    with open(os.path.join(fixtures_dir, name), "rb") as f:
+        return json_loads(f.read())
+
+
+@pytest.fixture(scope="session")
+def openapi_content():
+    """Expected OpenAPI document."""
+    return _load_fixture("openapi.json")
+
+
+@pytest.fixture(scope="session")
+def openapi_custom_content():
+    """Expected OpenAPI document behind a custom domain."""
+    return _load_fixture("openapi_custom.json")
+
+
+@pytest.fixture(scope="session")
+def openapi_apigw_content():
+    """Expected OpenAPI document behind an API Gateway stage."""
+    return _load_fixture("openapi_apigw.json")
+
+
+@pytest.fixture(autouse=True)
+def _clear_log_handlers():
+    """Drop the handlers API instances attach to the shared test logger."""
+    yield
+    logging.getLogger("test").handlers.clear()
@@ -1,8 +1,9 @@
 """Test aws-lambda-proxy."""
 
 import base64
+import copy
+import dataclasses
 import json
-import os
 import zlib
 from typing import Dict
 from unittest.mock import Mock
@@ -11,21 +12,29 @@ import pytest
 
 from aws_lambda_proxy import Response, StatusCode, proxy
 
-json_api = os.path.join(os.path.dirname(__file__), "fixtures", "openapi.json")
-with open(json_api, "r") as f:
-    openapi_content = json.loads(f.read())
 
-json_api_custom = os.path.join(
-    os.path.dirname(__file__), "fixtures", "openapi_custom.json"
-)
-with open(json_api_custom, "r") as f:
-    openapi_custom_content = json.loads(f.read())
+def funct(*args, **kwargs):
+    """Stub endpoint for tests that never call it."""
 
-json_apigw = os.path.join(os.path.dirname(__file__), "fixtures", "openapi_apigw.json")
-with open(json_apigw, "r") as f:
-    openapi_apigw_content = json.loads(f.read())
 
-funct = Mock(__name__="Mock")
+# Event and response shapes shared by the proxy path tests. The proxy mutates
+# events in place, so tests pass it a deep copy.
+get_event = {
+    "path": "/test/remote/pixel",
+    "httpMethod": "GET",
+    "headers": {},
+    "queryStringParameters": {},
+}
+cors_text_response = {
+    "body": "heyyyy",
+    "headers": {
+        "Access-Control-Allow-Credentials": "true",
+        "Access-Control-Allow-Methods": "GET",
+        "Access-Control-Allow-Origin": "*",
+        "Content-Type": "text/plain",
+    },
+    "statusCode": 200,
+}
 
 
 def test_value_converters():
@@ -52,7 +61,7 @@ def test_path_to_regex_convert():
     """Convert route path to regex."""
     path = "/jqtrde/<a>/<string:path>/<int:num>/<float:fl>/<uuid:id>/<regex([A-Z0-9]{5}):var>/<regex([a-z]{1}):othervar>"
     assert (
-        "^/jqtrde/([a-zA-Z0-9_]+)/([a-zA-Z0-9_]+)/([0-9]+)/([+-]?[0-9]+.[0-9]+)/([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/([A-Z0-9]{5})/([a-z]{1})$"
+        "^/jqtrde/([a-zA-Z0-9_]+)/([a-zA-Z0-9_]+)/([0-9]+)/([+-]?[0-9]+\\.[0-9]+)/([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/([A-Z0-9]{5})/([a-z]{1})$"
         == proxy._path_to_regex(path)
     )
 
@@ -69,9 +78,29 @@ def test_RouteEntry_default():
     assert route.endpoint == funct
     assert route.methods == ["GET"]
     assert not route.cors
+    assert not route.cors_headers
     assert not route.token
     assert not route.compression
     assert not route.b64encode
+    assert not hasattr(route, "__dict__")
+    assert route == proxy.RouteEntry(funct, "/endpoint/test/<id>")
+    assert route != proxy.RouteEntry(funct, "/endpoint/test/<name>")
+
+    # the endpoint signature is only inspected when building the OpenAPI document
+    route = proxy.RouteEntry(next, "/next")
+    with pytest.raises(ValueError):
+        route.openapi_parameters
+
+
+def test_Response():
+    """Response is an immutable slotted dataclass that survives copies."""
+    response = Response(StatusCode.OK, "text/plain", "heyyyy")
+    assert response.headers is None
+    assert not hasattr(response, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        response.body = "yo"  # type: ignore
+    assert copy.copy(response) == response
+    assert dataclasses.replace(response, body="yo").body == "yo"
 
 
 def test_RouteEntry_Options():
@@ -88,6 +117,7 @@ def test_RouteEntry_Options():
     assert route.endpoint == funct
     assert route.methods == ["POST"]
     assert route.cors
+    assert route.cors_headers["Access-Control-Allow-Methods"] == "POST"
     assert route.token == "Yo"
     assert route.compression == "deflate"
     assert route.b64encode
@@ -108,27 +138,19 @@ def test_API_init():
     """Should work as expected."""
     app = proxy.API(name="test")
     assert app.name == "test"
-    assert len(list(app.routes)) == 3
+    assert len(app.routes) == 3
     assert not app.debug
     assert app.log.getEffectiveLevel() == 40  # ERROR
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_noDocs():
     """Do not set default documentation routes."""
     app = proxy.API(name="test", add_docs=False)
     assert app.name == "test"
-    assert len(list(app.routes)) == 0
+    assert len(app.routes) == 0
     assert not app.debug
     assert app.log.getEffectiveLevel() == 40  # ERROR
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_noLog():
     """Should work as expected."""
@@ -137,25 +159,17 @@ def test_API_noLog():
     assert not app.debug
     assert app.log
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_logDebug():
     """Should work as expected."""
     app = proxy.API(name="test", debug=True)
     assert app.log.getEffectiveLevel() == 10  # DEBUG
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_addRoute():
     """Add and parse route."""
     app = proxy.API(name="test")
-    assert len(list(app.routes)) == 3
+    assert len(app.routes) == 3
 
     app._add_route("/endpoint/test/<id>", funct, methods=["GET"], cors=True, token="yo")
     assert app.routes
@@ -166,71 +180,25 @@ def test_API_addRoute():
     with pytest.raises(TypeError):
         app._add_route("/endpoint/test/<id>", funct, methods=["GET"], c=True)
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
-
-def test_proxy_API():
-    """Add and parse route."""
-    app = proxy.API(name="test")
-    funct = Mock(
-        __name__="Mock", return_value=Response(StatusCode.OK, "text/plain", "heyyyy")
-    )
-    app._add_route("/test/<string:user>/<name>", funct, methods=["GET"], cors=True)
 
-    event = {
-        "path": "/test/remote/pixel",
-        "httpMethod": "GET",
-        "headers": {},
-        "queryStringParameters": {},
-    }
-    resp = {
-        "body": "heyyyy",
-        "headers": {
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET",
-            "Access-Control-Allow-Origin": "*",
-            "Content-Type": "text/plain",
+@pytest.mark.parametrize(
+    "variant",
+    [
+        {},
+        {"resource": "/"},
+        {
+            "resource": "{something+}",
+            "pathParameters": {"something": "test/remote/pixel"},
         },
-        "statusCode": 200,
-    }
-    res = app(event, {})
-    assert res == resp
-    funct.assert_called_with(user="remote", name="pixel")
-
-
-def test_proxy_APIpath():
-    """Add and parse route."""
-    app = proxy.API(name="test")
-    funct = Mock(
-        __name__="Mock", return_value=Response(StatusCode.OK, "text/plain", "heyyyy")
-    )
-    app._add_route("/test/<string:user>/<name>", funct, methods=["GET"], cors=True)
-
-    event = {
-        "resource": "/",
-        "path": "/test/remote/pixel",
-        "httpMethod": "GET",
-        "headers": {},
-        "queryStringParameters": {},
-    }
-    resp = {
-        "body": "heyyyy",
-        "headers": {
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET",
-            "Access-Control-Allow-Origin": "*",
-            "Content-Type": "text/plain",
+        {
+            "resource": "/{something+}",
+            "pathParameters": {"something": "test/remote/pixel"},
+            "path": "/myapi/test/remote/pixel",
         },
-        "statusCode": 200,
-    }
-    res = app(event, {})
-    assert res == resp
-    funct.assert_called_with(user="remote", name="pixel")
-
-
-def test_proxy_APIpathProxy():
+    ],
+    ids=["path", "rootResource", "proxyResource", "customDomain"],
+)
+def test_proxy_API(variant):
     """Add and parse route."""
     app = proxy.API(name="test")
     funct = Mock(
@@ -238,58 +206,32 @@ def test_proxy_APIpathProxy():
     )
     app._add_route("/test/<string:user>/<name>", funct, methods=["GET"], cors=True)
 
-    event = {
-        "resource": "{something+}",
-        "pathParameters": {"something": "test/remote/pixel"},
-        "path": "/test/remote/pixel",
-        "httpMethod": "GET",
-        "headers": {},
-        "queryStringParameters": {},
-    }
-    resp = {
-        "body": "heyyyy",
-        "headers": {
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET",
-            "Access-Control-Allow-Origin": "*",
-            "Content-Type": "text/plain",
-        },
-        "statusCode": 200,
-    }
-    res = app(event, {})
-    assert res == resp
+    res = app(copy.deepcopy({**get_event, **variant}), {})
+    assert res == cors_text_response
     funct.assert_called_with(user="remote", name="pixel")
 
 
-def test_proxy_APIpathCustomDomain():
-    """Add and parse route."""
+def test_proxy_APIstatic():
+    """Dispatch literal routes through the static lookup table."""
     app = proxy.API(name="test")
     funct = Mock(
         __name__="Mock", return_value=Response(StatusCode.OK, "text/plain", "heyyyy")
     )
-    app._add_route("/test/<string:user>/<name>", funct, methods=["GET"], cors=True)
+    app._add_route("/test/remote/pixel", funct, methods=["GET"], cors=True)
+    assert (
+        app._router._static_routes[("GET", "/test/remote/pixel")][1] is app.routes[-1]
+    )
 
-    event = {
-        "resource": "/{something+}",
-        "pathParameters": {"something": "test/remote/pixel"},
-        "path": "/myapi/test/remote/pixel",
-        "httpMethod": "GET",
-        "headers": {},
-        "queryStringParameters": {},
-    }
-    resp = {
-        "body": "heyyyy",
-        "headers": {
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET",
-            "Access-Control-Allow-Origin": "*",
-            "Content-Type": "text/plain",
-        },
-        "statusCode": 200,
-    }
-    res = app(event, {})
-    assert res == resp
-    funct.assert_called_with(user="remote", name="pixel")
+    res = app(copy.deepcopy(get_event), {})
+    assert res == cors_text_response
+    funct.assert_called_with()
+
+    # regex routes registered later are not tried for a static hit
+    app._add_route("/test/<regex([a-z]+):name>/pixel", funct, methods=["GET"])
+    res = app(copy.deepcopy(get_event), {})
+    assert res == cors_text_response
+    assert not app._router._regex_routers
+    assert not app._router._match_cache
 
 
 def test_ttl():
@@ -311,6 +253,7 @@ def test_ttl():
             return_value=Response(StatusCode.BAD_REQUEST, "text/plain", "heyyyy"),
         )
         app._add_route("/yo", funct_error, methods=["GET"], cors=True, ttl=3600)
+    assert app.routes[-1].cache_header == "max-age=3600"
 
     event = {
         "path": "/test/remote/pixel",
@@ -554,7 +497,7 @@ def test_API_encoding():
 def test_API_compression():
     """Test compression and base64."""
     body = b"thisisafakeencodedjpeg"
-    gzip_compress = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    gzip_compress = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
     gzbody = gzip_compress.compress(body) + gzip_compress.flush()
     b64gzipbody = base64.b64encode(gzbody).decode()
 
@@ -568,6 +511,7 @@ def test_API_compression():
         methods=["GET"],
         cors=True,
         payload_compression_method="gzip",
+        payload_compression_min_bytes=0,
     )
 
     # Should compress because "Accept-Encoding" is in header
@@ -611,7 +555,7 @@ def test_API_compression():
     res = app(event, {})
     assert res == resp
 
-    # Should compress and encode to base64
+    # Should encode to base64 but not compress a body under the threshold
     app._add_route(
         "/test_compress_b64/<user>.jpg",
         funct,
@@ -627,12 +571,11 @@ def test_API_compression():
         "queryStringParameters": {},
     }
     resp = {
-        "body": b64gzipbody,
+        "body": base64.b64encode(body).decode(),
         "headers": {
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Allow-Methods": "GET",
             "Access-Control-Allow-Origin": "*",
-            "Content-Encoding": "gzip",
             "Content-Type": "image/jpeg",
         },
         "isBase64Encoded": True,
@@ -641,13 +584,47 @@ def test_API_compression():
     res = app(event, {})
     assert res == resp
 
+    # Should compress and encode to base64 once over the threshold
+    app._add_route(
+        "/test_compress_b64_small/<user>.jpg",
+        funct,
+        methods=["GET"],
+        cors=True,
+        payload_compression_method="gzip",
+        payload_compression_min_bytes=len(body),
+        binary_b64encode=True,
+    )
+    event["path"] = "/test_compress_b64_small/remotepixel.jpg"
+    res = app(event, {})
+    assert res["body"] == b64gzipbody
+    assert res["headers"]["Content-Encoding"] == "gzip"
+
+    # A str body is encoded before base64 even when it is not compressed
+    funct = Mock(
+        __name__="Mock",
+        return_value=Response(StatusCode.OK, "image/jpeg", body.decode()),
+    )
+    app._add_route(
+        "/test_compress_b64_str/<user>.jpg",
+        funct,
+        methods=["GET"],
+        cors=True,
+        payload_compression_method="gzip",
+        binary_b64encode=True,
+    )
+    event["path"] = "/test_compress_b64_str/remotepixel.jpg"
+    res = app(event, {})
+    assert res["body"] == base64.b64encode(body).decode()
+    assert res["isBase64Encoded"]
+    assert "Content-Encoding" not in res["headers"]
+
     funct = Mock(
         __name__="Mock",
         return_value=Response(
             StatusCode.OK, "application/json", json.dumps({"test": 0})
         ),
     )
-    # Should compress and encode to base64
+    # Should return a text body under the threshold as is
     app._add_route(
         "/test_compress_b64/<user>.json",
         funct,
@@ -663,20 +640,14 @@ def test_API_compression():
         "queryStringParameters": {},
     }
 
-    body = bytes(json.dumps({"test": 0}), "utf-8")
-    gzip_compress = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
-    gzbody = gzip_compress.compress(body) + gzip_compress.flush()
-    b64gzipbody = base64.b64encode(gzbody).decode()
     resp = {
-        "body": b64gzipbody,
+        "body": json.dumps({"test": 0}),
         "headers": {
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Allow-Methods": "GET",
             "Access-Control-Allow-Origin": "*",
-            "Content-Encoding": "gzip",
             "Content-Type": "application/json",
         },
-        "isBase64Encoded": True,
         "statusCode": 200,
     }
     res = app(event, {})
@@ -707,8 +678,8 @@ def test_API_otherCompression():
     """Test other compression."""
 
     body = b"thisisafakeencodedjpeg"
-    zlib_compress = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS)
-    deflate_compress = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    zlib_compress = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS)
+    deflate_compress = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
     zlibbody = zlib_compress.compress(body) + zlib_compress.flush()
     deflbody = deflate_compress.compress(body) + deflate_compress.flush()
 
@@ -722,6 +693,7 @@ def test_API_otherCompression():
         methods=["GET"],
         cors=True,
         payload_compression_method="deflate",
+        payload_compression_min_bytes=0,
     )
     app._add_route(
         "/test_zlib/<user>.jpg",
@@ -729,6 +701,7 @@ def test_API_otherCompression():
         methods=["GET"],
         cors=True,
         payload_compression_method="zlib",
+        payload_compression_min_bytes=0,
     )
 
     # Zlib
@@ -774,6 +747,72 @@ def test_API_otherCompression():
     assert res == resp
 
 
+def test_API_compressionThreshold():
+    """Skip compression of small bodies and honor the route level."""
+    small = b"thisisafakeencodedjpeg"
+    large = b"thisisafakeencodedjpeg" * 100
+
+    app = proxy.API(name="test")
+    funct = Mock(
+        __name__="Mock", return_value=Response(StatusCode.OK, "image/jpeg", small)
+    )
+    app._add_route(
+        "/small/<user>.jpg",
+        funct,
+        methods=["GET"],
+        payload_compression_method="zlib",
+    )
+    funct_large = Mock(
+        __name__="Mock", return_value=Response(StatusCode.OK, "image/jpeg", large)
+    )
+    app._add_route(
+        "/large/<user>.jpg",
+        funct_large,
+        methods=["GET"],
+        payload_compression_method="zlib",
+        payload_compression_level=1,
+    )
+
+    event = {
+        "path": "/small/remotepixel.jpg",
+        "httpMethod": "GET",
+        "headers": {"Accept-Encoding": "zlib, gzip, deflate"},
+        "queryStringParameters": {},
+    }
+    res = app(event, {})
+    assert res["body"] == small
+    assert "Content-Encoding" not in res["headers"]
+
+    event["path"] = "/large/remotepixel.jpg"
+    res = app(event, {})
+    assert res["body"] == zlib.compress(large, 1)
+    assert res["headers"]["Content-Encoding"] == "zlib"
+
+    # a str body under the threshold is returned as the original str
+    funct_text = Mock(
+        __name__="Mock", return_value=Response(StatusCode.OK, "text/plain", "heyyyy")
+    )
+    app._add_route(
+        "/text/<user>",
+        funct_text,
+        methods=["GET"],
+        payload_compression_method="zlib",
+    )
+    event["path"] = "/text/remotepixel"
+    res = app(event, {})
+    assert isinstance(res["body"], str)
+    assert res["body"] == "heyyyy"
+    assert "Content-Encoding" not in res["headers"]
+
+    with pytest.raises(ValueError):
+        app._add_route(
+            "/invalid/<user>.jpg",
+            funct,
+            payload_compression_method="zlib",
+            payload_compression_level=10,
+        )
+
+
 def test_API_compression_invalid():
     """Test other compression."""
     app = proxy.API(name="test")
@@ -787,6 +826,7 @@ def test_API_compression_invalid():
         methods=["GET"],
         cors=True,
         payload_compression_method="gzip",
+        payload_compression_min_bytes=0,
     )
     entry.compression = "nope"
 
@@ -797,7 +837,7 @@ def test_API_compression_invalid():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "Unsupported compression mode: nope"}',
+        "body": '{"errorMessage":"Unsupported compression mode: nope"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 500,
     }
@@ -820,7 +860,7 @@ def test_API_routeURL():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "Missing or invalid path"}',
+        "body": '{"errorMessage":"Missing or invalid path"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 400,
     }
@@ -834,7 +874,7 @@ def test_API_routeURL():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "No view function for: GET - /users/remotepixel"}',
+        "body": '{"errorMessage":"No view function for: GET - /users/remotepixel"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 400,
     }
@@ -848,7 +888,7 @@ def test_API_routeURL():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "No view function for: POST - /test/remotepixel"}',
+        "body": '{"errorMessage":"No view function for: POST - /test/remotepixel"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 400,
     }
@@ -862,7 +902,7 @@ def test_API_routeURL():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "No view function for: GET - /users/remotepixel"}',
+        "body": '{"errorMessage":"No view function for: GET - /users/remotepixel"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 400,
     }
@@ -876,7 +916,7 @@ def test_API_routeURL():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "No view function for: GET - /test/users/remotepixel"}',
+        "body": '{"errorMessage":"No view function for: GET - /test/users/remotepixel"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 400,
     }
@@ -919,10 +959,6 @@ def test_API_routeURL():
         ext="jpeg",
     )
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_routeToken(monkeypatch):
     """Validate tokens."""
@@ -981,7 +1017,7 @@ def test_API_routeToken(monkeypatch):
         "queryStringParameters": {"access_token": "yep"},
     }
     resp = {
-        "body": '{"message": "Invalid access token"}',
+        "body": '{"message":"Invalid access token"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 500,
     }
@@ -995,7 +1031,7 @@ def test_API_routeToken(monkeypatch):
         "queryStringParameters": {"token": "yo"},
     }
     resp = {
-        "body": '{"message": "Invalid access token"}',
+        "body": '{"message":"Invalid access token"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 500,
     }
@@ -1011,17 +1047,13 @@ def test_API_routeToken(monkeypatch):
         "queryStringParameters": {"access_token": "yo"},
     }
     resp = {
-        "body": '{"message": "Invalid access token"}',
+        "body": '{"message":"Invalid access token"}',
         "headers": {"Content-Type": "application/json"},
         "statusCode": 500,
     }
     res = app(event, {})
     assert res == resp
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_functionError():
     """Add and parse route."""
@@ -1036,7 +1068,7 @@ def test_API_functionError():
         "queryStringParameters": {},
     }
     resp = {
-        "body": '{"errorMessage": "hey something went wrong"}',
+        "body": '{"errorMessage":"hey something went wrong"}',
         "headers": {
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Allow-Methods": "GET",
@@ -1048,10 +1080,6 @@ def test_API_functionError():
     res = app(event, {})
     assert res == resp
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_Post():
     """Should work as expected on POST request."""
@@ -1124,10 +1152,6 @@ def test_API_Post():
     assert res == resp
     funct.assert_called_with(user="remotepixel")
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_ctx():
     """Should work as expected and pass ctx and evt to the function."""
@@ -1165,10 +1189,6 @@ def test_API_ctx():
     assert body["evt"] == event
     assert body["ctx"] == {"ctx": "jqtrde"}
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_API_multipleRoute():
     """Should work as expected."""
@@ -1219,12 +1239,8 @@ def test_API_multipleRoute():
     assert body["num"] == 1
     assert body["params"] == "1"
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
-def test_API_doc():
+def test_API_doc(openapi_content):
     """Should work as expected."""
     app = proxy.API(name="test")
 
@@ -1320,12 +1336,34 @@ def test_API_doc():
     assert res["statusCode"] == 200
     assert res["headers"] == headers
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
+
+def test_API_docCache():
+    """Reuse OpenAPI document until a route is added."""
+    app = proxy.API(name="test")
+
+    event = {
+        "path": "/openapi.json",
+        "httpMethod": "GET",
+        "headers": {},
+        "queryStringParameters": {},
+    }
+    res = app(event, {})
+    assert "/test" not in json.loads(res["body"])["paths"]
+    assert app(event, {})["body"] is res["body"]
+    openapi = app._get_openapi()
+    assert app._get_openapi() is openapi
+
+    @app.get("/test")
+    def _test() -> Response:
+        """Return something."""
+        return Response(StatusCode.OK, "text/plain", "Yo")
+
+    res = app(event, {})
+    assert "/test" in json.loads(res["body"])["paths"]
+    assert app._get_openapi() is not openapi
 
 
-def test_API_doc_apigw():
+def test_API_doc_apigw(openapi_apigw_content):
     """Should work as expected if request from api-gateway."""
     app = proxy.API(name="test")
 
@@ -1406,12 +1444,8 @@ def test_API_doc_apigw():
     assert res["statusCode"] == 200
     assert res["headers"] == headers
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
-def test_API_docCustomDomain():
+def test_API_docCustomDomain(openapi_custom_content):
     """Should work as expected."""
     app = proxy.API(name="test")
 
@@ -1475,10 +1509,6 @@ def test_API_docCustomDomain():
     assert res["headers"] == headers
     assert openapi_custom_content == body
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_routeRegex():
     """Add and parse route."""
@@ -1541,10 +1571,6 @@ def test_routeRegex():
     assert res == resp
     funct_two.assert_called_with(number="1234", name="pix")
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
-
 
 def test_routeRegexFailing():
     """Add and parse route."""
@@ -1552,8 +1578,17 @@ def test_routeRegexFailing():
     funct = Mock(
         __name__="Mock", return_value=Response(StatusCode.OK, "text/plain", "yooooo")
     )
+    with pytest.raises(ValueError):
+        app._add_route(
+            r"/test/<regex(user(\d+)?):user>/<sport>",
+            funct,
+            methods=["GET"],
+            cors=True,
+        )
+    assert ("GET", r"/test/<regex(user(\d+)?):user>/<sport>") not in app._router
+
     app._add_route(
-        r"/test/<regex(user(\d+)?):user>/<sport>",
+        r"/test/<regex(user(?:\d+)?):user>/<sport>",
         funct,
         methods=["GET"],
         cors=True,
@@ -1564,130 +1599,246 @@ def test_routeRegexFailing():
         "headers": {},
         "queryStringParameters": {},
     }
-    with pytest.raises(Exception):
-        app(event, {})
-        funct.assert_not_called()
+    app(event, {})
+    funct.assert_called_with(user="user1234", sport="rugby")
 
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
 
+def test_routeRegexMany():
+    """Match many regex routes through one alternation, rebuilt on change."""
+    app = proxy.API(name="test")
+    for num in range(150):
+        app._add_route(
+            f"/test{num}/<regex([0-9]+):number>/<regex([a-z]+):name>",
+            Mock(
+                __name__="Mock",
+                return_value=Response(StatusCode.OK, "text/plain", f"route{num}"),
+            ),
+            methods=["GET"],
+        )
+    event = {"httpMethod": "GET", "headers": {}, "queryStringParameters": {}}
 
-def testApigwPath():
-    """test api call parsing."""
-    # resource "/", no apigwg, noproxy, no path mapping
-    event = {"path": "/test/1234/pix", "headers": {}}
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert not p.apigw_stage
-    assert not p.api_prefix
-    assert not p.path_mapping
-    assert p.prefix == ""
+    res = app({**event, "path": "/test149/12/ab"}, {})
+    assert res["body"] == "route149"
+    app.routes[-1].endpoint.assert_called_with(number="12", name="ab")
 
-    event = {"resource": "/", "path": "/test/1234/pix", "headers": {}}
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert not p.apigw_stage
-    assert not p.api_prefix
-    assert not p.path_mapping
-    assert p.prefix == ""
+    res = app({**event, "path": "/test0/12/ab"}, {})
+    assert res["body"] == "route0"
 
-    # resource "proxy+", no apigwg, no path mapping, no api prefix
-    event = {
-        "resource": "/{proxy+}",
-        "pathParameters": {"proxy": "test/1234/pix"},
-        "path": "/test/1234/pix",
-        "headers": {},
-    }
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert not p.apigw_stage
-    assert not p.api_prefix
-    assert not p.path_mapping
-    assert p.prefix == ""
+    res = app({**event, "path": "/test150/12/ab"}, {})
+    assert res["statusCode"] == 400
 
-    # resource "proxy+", no apigwg, no path mapping, api prefix (api)
-    event = {
-        "resource": "/api/{proxy+}",
-        "pathParameters": {"proxy": "test/1234/pix"},
-        "path": "/api/test/1234/pix",
-        "headers": {},
-    }
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert not p.apigw_stage
-    assert p.api_prefix == "/api"
-    assert not p.path_mapping
-    assert p.prefix == "/api"
+    @app.get("/test150/<regex([0-9]+):number>/<regex([a-z]+):name>")
+    def _last(number: str, name: str) -> Response:
+        return Response(StatusCode.OK, "text/plain", "route150")
 
-    # resource "proxy+", no apigwg, path mapping (prefix), api prefix (api)
-    event = {
-        "resource": "/api/{proxy+}",
-        "pathParameters": {"proxy": "test/1234/pix"},
-        "path": "/prefix/api/test/1234/pix",
-        "headers": {},
-    }
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert not p.apigw_stage
-    assert p.api_prefix == "/api"
-    assert p.path_mapping == "/prefix"
-    assert p.prefix == "/prefix/api"
+    res = app({**event, "path": "/test150/12/ab"}, {})
+    assert res["body"] == "route150"
 
-    # resource "proxy+", apigwg (production), api prefix (api)
-    event = {
-        "resource": "/api/{proxy+}",
-        "pathParameters": {"proxy": "test/1234/pix"},
-        "path": "/prefix/api/test/1234/pix",
-        "headers": {"host": "afakeapi.execute-api.us-east-1.amazonaws.com"},
-        "requestContext": {"stage": "production"},
-    }
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert p.apigw_stage == "production"
-    assert p.api_prefix == "/api"
-    assert not p.path_mapping
-    assert p.prefix == "/production/api"
-
-    # New HTTP API integration
-    # by `default` api gateway will deploy the API with a `$default` stage
-    # pointing to the `root` host.
-    # $default -> https://ggnbmhlvlf.execute-api.us-east-1.amazonaws.com
-    # You can then add other stage:
-    # $default -> https://ggnbmhlvlf.execute-api.us-east-1.amazonaws.com
-    # test -> https://ggnbmhlvlf.execute-api.us-east-1.amazonaws.com/test
-    #
-    # resource "proxy+", apigwg stage ($default), no path mapping, no api prefix
-    event = {
-        "version": "1.0",
-        "resource": "/{proxy+}",
-        "pathParameters": {"proxy": "test/1234/pix"},
-        "path": "test/1234/pix",
-        "headers": {"host": "afakeapi.execute-api.us-east-1.amazonaws.com"},
-        "requestContext": {"stage": "$default"},
-    }
-    p = proxy.ApigwPath(event)
-    assert p.path == "/test/1234/pix"
-    assert p.apigw_stage == "$default"
-    assert not p.api_prefix
-    assert not p.path_mapping
-    assert not p.prefix
 
-    # resource "proxy+", apigwg stage (production), no path mapping, no api prefix
-    event = {
-        "version": "1.0",
-        "resource": "/{proxy+}",
-        "pathParameters": {"proxy": "test/1234/pix"},
-        "path": "test/1234/pix",
-        "headers": {"host": "afakeapi.execute-api.us-east-1.amazonaws.com"},
-        "requestContext": {"stage": "production"},
-    }
-    p = proxy.ApigwPath(event)
+def test_routeMatchCache():
+    """Reuse resolved dynamic matches until a route is added."""
+    app = proxy.API(name="test", add_docs=False)
+    funct = Mock(
+        __name__="Mock", return_value=Response(StatusCode.OK, "text/plain", "user")
+    )
+    app._add_route("/<user>/info", funct, methods=["GET"])
+    event = {"httpMethod": "GET", "headers": {}, "queryStringParameters": {}}
+
+    app({**event, "path": "/remote/info", "queryStringParameters": {"q": "1"}}, {})
+    funct.assert_called_with(user="remote", q="1")
+    assert ("GET", "/remote/info") in app._router._match_cache
+
+    # query parameters must not leak into the cached path arguments
+    app({**event, "path": "/remote/info"}, {})
+    funct.assert_called_with(user="remote")
+
+    res = app({**event, "path": "/remote/pixel/info"}, {})
+    assert res["statusCode"] == 400
+    assert ("GET", "/remote/pixel/info") not in app._router._match_cache
+
+    @app.get("/<user>/<page>/info")
+    def _page(user: str, page: str) -> Response:
+        return Response(StatusCode.OK, "text/plain", page)
+
+    assert not app._router._match_cache
+    res = app({**event, "path": "/remote/pixel/info"}, {})
+    assert res["body"] == "pixel"
+
+
+def test_routeTrailingNewline():
+    """Do not let ``$`` accept a trailing newline in the request path."""
+    app = proxy.API(name="test", add_docs=False)
+    app._add_route("/<int:id>", funct, methods=["GET"])
+    app._add_route("/item/<regex([a-z]+):name>", funct, methods=["GET"])
+
+    assert app._url_matching("/12", "GET")
+    assert not app._url_matching("/12\n", "GET")
+    assert app._url_matching("/item/abc", "GET")
+    assert not app._url_matching("/item/abc\n", "GET")
+
+
+def test_routePriority():
+    """The first registered matching route wins."""
+    app = proxy.API(name="test")
+
+    @app.get("/<user>/info")
+    def _user(user: str) -> Response:
+        return Response(StatusCode.OK, "text/plain", f"user-{user}")
+
+    @app.get("/admin/info")
+    def _admin() -> Response:
+        return Response(StatusCode.OK, "text/plain", "admin")
+
+    @app.get("/<regex([a-z]+):name>/info")
+    def _name(name: str) -> Response:
+        return Response(StatusCode.OK, "text/plain", f"name-{name}")
+
+    @app.get("/<regex([0-9]+):num>")
+    def _num(num: str) -> Response:
+        return Response(StatusCode.OK, "text/plain", f"num-{num}")
+
+    @app.get("/<int:value>")
+    def _value(value: int) -> Response:
+        return Response(StatusCode.OK, "text/plain", f"value-{value}")
+
+    event = {"httpMethod": "GET", "headers": {}, "queryStringParameters": {}}
+
+    res = app({**event, "path": "/admin/info"}, {})
+    assert res["body"] == "user-admin"
+
+    res = app({**event, "path": "/remote/info"}, {})
+    assert res["body"] == "user-remote"
+
+    res = app({**event, "path": "/remote-pixel/info"}, {})
+    assert res["statusCode"] == 400
+
+    res = app({**event, "path": "/12"}, {})
+    assert res["body"] == "num-12"
+
+    app = proxy.API(name="test", add_docs=False)
+    app._add_route("/<int:n>/a", funct, methods=["GET"])
+    app._add_route("/<user>", funct, methods=["GET"])
+    app._add_route("/<int:n>", funct, methods=["GET"])
+    app._add_route("/admin", funct, methods=["GET"])
+    assert app._url_matching("/5", "GET")[0].path == "/<user>"
+    assert app._url_matching("/5/a", "GET")[0].path == "/<int:n>/a"
+    assert app._url_matching("/admin", "GET")[0].path == "/<user>"
+
+
+_proxy_resource = {
+    "resource": "/api/{proxy+}",
+    "pathParameters": {"proxy": "test/1234/pix"},
+}
+
+
+@pytest.mark.parametrize(
+    "event,stage,api_prefix,path_mapping,prefix",
+    [
+        pytest.param(
+            {"path": "/test/1234/pix", "headers": {}},
+            "",
+            "",
+            "",
+            "",
+            id="no-resource",
+        ),
+        pytest.param(
+            {"resource": "/", "path": "/test/1234/pix", "headers": {}},
+            "",
+            "",
+            "",
+            "",
+            id="root-resource",
+        ),
+        pytest.param(
+            {
+                "resource": "/{proxy+}",
+                "pathParameters": {"proxy": "test/1234/pix"},
+                "path": "/test/1234/pix",
+                "headers": {},
+            },
+            "",
+            "",
+            "",
+            "",
+            id="proxy",
+        ),
+        pytest.param(
+            {**_proxy_resource, "path": "/api/test/1234/pix", "headers": {}},
+            "",
+            "/api",
+            "",
+            "/api",
+            id="proxy-api-prefix",
+        ),
+        pytest.param(
+            {**_proxy_resource, "path": "/prefix/api/test/1234/pix", "headers": {}},
+            "",
+            "/api",
+            "/prefix",
+            "/prefix/api",
+            id="proxy-path-mapping",
+        ),
+        pytest.param(
+            {
+                **_proxy_resource,
+                "path": "/prefix/api/test/1234/pix",
+                "headers": {"host": "afakeapi.execute-api.us-east-1.amazonaws.com"},
+                "requestContext": {"stage": "production"},
+            },
+            "production",
+            "/api",
+            "",
+            "/production/api",
+            id="proxy-stage-api-prefix",
+        ),
+        # New HTTP API integration
+        # by `default` api gateway will deploy the API with a `$default` stage
+        # pointing to the `root` host.
+        # $default -> https://ggnbmhlvlf.execute-api.us-east-1.amazonaws.com
+        # You can then add other stage:
+        # $default -> https://ggnbmhlvlf.execute-api.us-east-1.amazonaws.com
+        # test -> https://ggnbmhlvlf.execute-api.us-east-1.amazonaws.com/test
+        pytest.param(
+            {
+                "version": "1.0",
+                "resource": "/{proxy+}",
+                "pathParameters": {"proxy": "test/1234/pix"},
+                "path": "test/1234/pix",
+                "headers": {"host": "afakeapi.execute-api.us-east-1.amazonaws.com"},
+                "requestContext": {"stage": "$default"},
+            },
+            "$default",
+            "",
+            "",
+            "",
+            id="http-api-default-stage",
+        ),
+        pytest.param(
+            {
+                "version": "1.0",
+                "resource": "/{proxy+}",
+                "pathParameters": {"proxy": "test/1234/pix"},
+                "path": "test/1234/pix",
+                "headers": {"host": "afakeapi.execute-api.us-east-1.amazonaws.com"},
+                "requestContext": {"stage": "production"},
+            },
+            "production",
+            "",
+            "",
+            "/production",
+            id="http-api-stage",
+        ),
+    ],
+)
+def test_ApigwPath(event, stage, api_prefix, path_mapping, prefix):
+    """test api call parsing."""
+    p = proxy.ApigwPath(copy.deepcopy(event))
     assert p.path == "/test/1234/pix"
-    assert p.apigw_stage == "production"
-    assert not p.api_prefix
-    assert not p.path_mapping
-    assert p.prefix == "/production"
+    assert p.apigw_stage == stage
+    assert p.api_prefix == api_prefix
+    assert p.path_mapping == path_mapping
+    assert p.prefix == prefix
 
 
 def testApigwHostUrl():
@@ -1784,8 +1935,9 @@ def testApigwHostUrl():
     assert app.host == "http://127.0.0.0:8000"
 
 
-def test_API_simpleRoute():
-    """Should work as expected."""
+@pytest.fixture
+def simple_app():
+    """API with one route per HTTP method."""
     app = proxy.API(name="test")
 
     @app.post("/test")
@@ -1823,6 +1975,11 @@ def test_API_simpleRoute():
         """Return something."""
         return Response(StatusCode.OK, "text/plain", user)
 
+    return app
+
+
+def test_API_simpleRoute(simple_app):
+    """Should work as expected."""
     event = {
         "path": "/remotepixel",
         "httpMethod": "GET",
@@ -1836,42 +1993,38 @@ def test_API_simpleRoute():
         "Content-Type": "text/plain",
     }
 
-    res = app(event, {})
+    res = simple_app(event, {})
     assert res["statusCode"] == 200
     assert res["headers"] == headers
     assert res["body"] == "remotepixel"
 
-    for method in ["POST", "PUT", "PATCH"]:
-        event = {
-            "path": "/test",
-            "httpMethod": method,
-            "headers": {},
-            "queryStringParameters": {},
-            "body": f"yo {method.lower()}",
-        }
-        headers = {
-            "Content-Type": "text/plain",
-        }
-        res = app(event, {})
-        assert res["statusCode"] == 200
-        assert res["headers"] == headers
-        assert res["body"] == f"yo {method.lower()}"
-
-    for method in ["DELETE", "OPTIONS", "HEAD"]:
-        event = {
-            "path": "/test",
-            "httpMethod": method,
-            "headers": {},
-            "queryStringParameters": {},
-        }
-        headers = {
-            "Content-Type": "text/plain",
-        }
-        res = app(event, {})
-        assert res["statusCode"] == 200
-        assert res["headers"] == headers
-        assert res["body"] == "test"
-
-    # Clear logger handlers
-    for h in app.log.handlers:
-        app.log.removeHandler(h)
+
+@pytest.mark.parametrize("method", ["POST", "PUT", "PATCH"])
+def test_API_simpleRouteBody(simple_app, method):
+    """Pass the request body to the endpoint."""
+    event = {
+        "path": "/test",
+        "httpMethod": method,
+        "headers": {},
+        "queryStringParameters": {},
+        "body": f"yo {method.lower()}",
+    }
+    res = simple_app(event, {})
+    assert res["statusCode"] == 200
+    assert res["headers"] == {"Content-Type": "text/plain"}
+    assert res["body"] == f"yo {method.lower()}"
+
+
+@pytest.mark.parametrize("method", ["DELETE", "OPTIONS", "HEAD"])
+def test_API_simpleRouteNoBody(simple_app, method):
+    """Route methods without a request body."""
+    event = {
+        "path": "/test",
+        "httpMethod": method,
+        "headers": {},
+        "queryStringParameters": {},
+    }
+    res = simple_app(event, {})
+    assert res["statusCode"] == 200
+    assert res["headers"] == {"Content-Type": "text/plain"}
+    assert res["body"] == "test"